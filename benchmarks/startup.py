@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Measures the startup cost paid by every short-lived import job or worker
+process: importing csv_harvester, and defining harvesters which validate
+their fields against a model. Each measurement runs in a fresh interpreter.
+
+To keep the import cheap, modules only needed by optional features (decimal
+for DecimalField, json for JSONLinesReporter, hashlib and cPickle for
+incremental loads, zlib for key sharding, threading and Queue for read-ahead)
+are imported where those features are set up, once per use rather than per
+row, instead of at the top of the package's modules.
+
+Usage: python benchmarks/startup.py [repeat]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT = '''
+import time
+started = time.time()
+import csv_harvester
+print time.time() - started
+'''
+
+DEFINE = '''
+import time
+import csv_harvester
+from csv_harvester import columns
+
+class Model(object):
+	def __init__(self):
+		for i in range(20):
+			setattr(self, 'field_%s' % i, None)
+
+started = time.time()
+for i in range(50):
+	attrs = dict(
+		('field_%s' % j, columns.TextField()) for j in range(20))
+	attrs['Meta'] = type('Meta', (), {'model': Model})
+	attrs['__module__'] = 'benchmark'
+	type('Harvester%s' % i, (csv_harvester.Harvester,), attrs)
+print time.time() - started
+'''
+
+
+def measure(code, repeat):
+	timings = []
+	for i in range(repeat):
+		output = subprocess.check_output(
+			[sys.executable, '-c', code], cwd=ROOT)
+		timings.append(float(output.strip()))
+	return min(timings), sum(timings) / len(timings)
+
+
+if __name__ == '__main__':
+	repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+	for name, code in (
+			('import csv_harvester', IMPORT),
+			('define 50 harvesters', DEFINE)):
+		best, average = measure(code, repeat)
+		print '%-24s best %.2fms, average %.2fms' % (
+			name, best * 1000, average * 1000)
@@ -1,13 +1,15 @@
 import bisect
 import collections
 import csv
-import operator
 import pprint
+import time
 import warnings
 
 from . import columns, constants
 from .constants import ConfigurationError, ValidationError
-from .utils import odict, ClassDict, CSVReader
+from .hashstore import HashStore, FileHashStore, ModelHashStore
+from .progress import ProgressTracker, ConsoleReporter, JSONLinesReporter
+from .utils import odict, ClassDict, BoundedDict, CSVReader, count_lines, parse_shard
 
 
 class Processor(object):
@@ -18,44 +20,376 @@ class Processor(object):
 	column_offset = 0
 	rows_to_read = None
 	ignore_errors = False
+	# Read and decode the file in a background thread, see CSVReader
+	read_ahead = False
+	# Callables receiving a progress snapshot, see progress.ProgressTracker
+	progress_callbacks = ()
+	progress_every_rows = 10000
+	progress_every_seconds = None
+	# Either an (index, count) tuple or an "index/count" string, with the
+	# index counting from 0, to only load one share of the file. With
+	# SHARD_BY_BYTES, each shard reads the rows starting within its byte range
+	# of the file, which requires one row per line; a ConfigurationError is
+	# raised on finding a row spanning several lines, as its lines may have
+	# been split across shards. With SHARD_BY_KEY, rows are distributed by a
+	# hash of the shard_key field, so all the rows for a key land in the same
+	# shard.
+	shard = None
+	shard_strategy = constants.SHARD_BY_BYTES
+	shard_key = None
+	# A HashStore instance, to only parse and save the rows that are new or
+	# have changed since the last import, as identified by the raw cells of
+	# the incremental_key field. It can't be combined with sharding by bytes,
+	# as byte ranges move as the file changes. When sharding by key, the
+	# shard_key must be the incremental_key, each shard needs its own store,
+	# and the shard count must stay the same from one import to the next;
+	# change it only with fresh stores.
+	hash_store = None
+	incremental_key = None
+	# The number of parsed rows handed to batch_clean() at a time
+	batch_size = 1000
 	
 	def __init__(self):
 		self._harvesters = []
+		self._row_hashes = []
+		self._seen_keys = set()
+		# State kept across batches by batch_clean(), which should use bounded
+		# structures such as BoundedDict to keep memory use flat
+		self.batch_state = ClassDict()
 		if not self.harvester:
 			raise ConfigurationError('No harvester specified for processor %s.' % self.__class__.__name__)
 
 	def load(self, filename, **kwargs):
 		"""
-		
+		Reads and parses the rows of the given CSV file, keeping the parsed
+		harvesters for a later call to :meth:`save`. Any keyword arguments are
+		passed on to the :class:`CSVReader`.
 		"""
 		params = {
 			'encoding': self.encoding,
 			'dialect': csv.excel_tab if self.tab_separated else csv.excel,
+			'read_ahead': self.read_ahead,
 		}
 		params.update(kwargs)
+		self._configure()
+		incremental = self.hash_store is not None
 		with CSVReader(filename, **params) as reader:
-			# Skip lines based on the row offset specified
-			[reader.next() for i in range(self.row_offset)]
-			# Read the rows
-			rows_read = 0
-			rows_parsed = 0
-			for row in reader:
+			start, end, row_number = self._seek_shard(reader, filename)
+			progress = ProgressTracker(
+				self.progress_callbacks or (),
+				every_rows=self.progress_every_rows,
+				every_seconds=self.progress_every_seconds,
+				total_bytes=(end or reader.size) - start,
+			)
+			# Only time the stages if someone is listening
+			timed = bool(progress.callbacks)
+			clock = time.time
+			progress.start()
+			# Parsed rows waiting for batch_clean(), as (row number, harvester,
+			# (row key, digest) or None) tuples
+			batch = []
+			rows = self._read_rows(reader, end, row_number)
+			while True:
+				# The read latency of a row includes any skipped rows before it
+				if timed:
+					started = clock()
 				try:
-					parsed = self.harvester(row[self.column_offset:])
-					self._harvesters += [parsed]
-					rows_parsed += 1
-				except ValidationError, e:
-					if not self.ignore_errors:
-						raise
-					warnings.warn(e.message)
-				rows_read += 1
-				if self.rows_to_read and rows_parsed >= self.rows_to_read:
+					row_number, row = rows.next()
+				except StopIteration:
 					break
-			print '%s of %s rows parsed.' % (rows_parsed, rows_read)
+				if timed:
+					read = clock()
+					progress.latencies['read'] += read - started
+				digest = None
+				if incremental:
+					row_key, digest = self._row_digest(row)
+					self._seen_keys.add(row_key)
+				# Unchanged rows are skipped, but still go through the progress
+				# reporting below
+				if digest and self.hash_store.get(row_key) == digest:
+					progress.rows_unchanged += 1
+				else:
+					parsed = self._parse_row(row_number, row, progress)
+					if parsed is not None:
+						batch += [(row_number, parsed, (row_key, digest) if digest else None)]
+				progress.rows_read += 1
+				if timed:
+					now = clock()
+					progress.latencies['parse'] += now - read
+				if len(batch) >= self.batch_size:
+					self._flush_batch(batch, progress, timed)
+					batch = []
+				if timed and progress.due(now):
+					if reader.seekable:
+						progress.bytes_read = reader.tell() - start
+					progress.report(now)
+				if self.rows_to_read and progress.rows_parsed >= self.rows_to_read:
+					# Rows rejected by batch_clean() don't count towards the
+					# limit, so clean the pending rows before deciding to stop
+					self._flush_batch(batch, progress, timed)
+					batch = []
+					if progress.rows_parsed >= self.rows_to_read:
+						break
+			self._flush_batch(batch, progress, timed)
+			if timed:
+				if reader.seekable:
+					progress.bytes_read = reader.tell() - start
+				progress.report(finished=True)
+			if incremental:
+				print '%s of %s rows parsed, %s unchanged.' % (
+					progress.rows_parsed, progress.rows_read,
+					progress.rows_unchanged)
+			else:
+				print '%s of %s rows parsed.' % (progress.rows_parsed, progress.rows_read)
+	
+	def _configure(self):
+		"""
+		Checks the sharding and incremental options before a load, and keeps
+		what the per-row helpers need.
+		"""
+		self._shard = None
+		self._shard_columns = None
+		if self.shard is not None:
+			self._shard = parse_shard(self.shard)
+			if self.shard_strategy == constants.SHARD_BY_KEY:
+				if not self.shard_key:
+					raise ConfigurationError(
+						'A shard_key is required to shard processor %s by key.'
+						% self.__class__.__name__)
+				self._shard_columns = self.harvester._columns(self.shard_key)
+				from zlib import crc32
+				self._crc32 = crc32
+			elif self.shard_strategy != constants.SHARD_BY_BYTES:
+				raise ConfigurationError(
+					'Unknown shard strategy "%s".' % self.shard_strategy)
+		if self.hash_store is not None:
+			if not self.incremental_key:
+				raise ConfigurationError(
+					'An incremental_key is required to use a hash store with '
+					'processor %s.' % self.__class__.__name__)
+			if self._shard and self.shard_strategy == constants.SHARD_BY_BYTES:
+				raise ConfigurationError(
+					'Processor %s cannot use a hash store when sharding by '
+					'byte range, as rows move between shards when the file '
+					'changes. Shard by key instead.' % self.__class__.__name__)
+			if self._shard and self.shard_key != self.incremental_key:
+				raise ConfigurationError(
+					'Processor %s must shard by its incremental_key "%s" to use '
+					'a hash store, so that every key stays in the same shard.'
+					% (self.__class__.__name__, self.incremental_key))
+			self._hash_columns = self.harvester._columns(self.incremental_key)
+			from hashlib import md5
+			self._md5 = md5
+	
+	def _seek_shard(self, reader, filename):
+		"""
+		Moves the reader to the start of this processor's byte range when
+		sharding by bytes.
+		
+		:returns: the start and end offsets of the range (end being None when
+			reading to the end of the file), and the number of rows before it.
+		"""
+		if not self._shard or self.shard_strategy != constants.SHARD_BY_BYTES:
+			return 0, None, 0
+		if not reader.seekable:
+			raise ConfigurationError(
+				'Cannot shard %s by byte range, as it is not seekable.'
+				% filename)
+		index, count = self._shard
+		reader.seek(reader.size * index // count)
+		start = reader.tell()
+		return start, reader.size * (index + 1) // count, count_lines(filename, start)
+	
+	def _read_rows(self, reader, end, row_number):
+		"""
+		Yields ``(row number, row)`` for the rows to load, leaving out the rows
+		before ``row_offset`` and those belonging to other shards. Row numbers
+		count from 1 at the top of the file, so all shards report the same
+		numbers.
+		"""
+		line_number = reader.line_number
+		# Stop at the first row starting past this shard's byte range
+		while end is None or reader.tell() < end:
+			row = reader.next()
+			row_number += 1
+			if end is not None:
+				if reader.line_number - line_number > 1:
+					raise ConfigurationError(
+						'Row %s spans several lines, which sharding by byte '
+						'range does not support. Shard by key instead.'
+						% row_number)
+				line_number = reader.line_number
+			# Skip lines based on the row offset specified
+			if row_number <= self.row_offset:
+				continue
+			row = row[self.column_offset:]
+			if self._shard_columns is not None and not self._in_shard(row):
+				continue
+			yield row_number, row
+	
+	def _in_shard(self, row):
+		"""
+		Whether the row belongs to this processor's shard when sharding by key.
+		"""
+		index, count = self._shard
+		shard_key = u'\x1f'.join(row[self._shard_columns]).encode('utf-8')
+		return (self._crc32(shard_key) & 0xffffffff) % count == index
+	
+	def _row_digest(self, row):
+		"""
+		:returns: the row's incremental key and a hash of all its raw cells.
+		"""
+		row_key = u'\x1f'.join(row[self._hash_columns])
+		digest = self._md5(u'\x1f'.join(row).encode('utf-8')).hexdigest()[:16]
+		return row_key, digest
+	
+	def _parse_row(self, row_number, row, progress):
+		"""
+		:returns: a harvester instance for the row, or None if it failed
+			validation and errors are ignored.
+		"""
+		try:
+			parsed = self.harvester(row)
+		except ValidationError, e:
+			if not self.ignore_errors:
+				raise
+			progress.errors += 1
+			warnings.warn('Row %s: %s' % (row_number, e.message))
+			return None
+		progress.rows_parsed += 1
+		return parsed
+	
+	def _flush_batch(self, rows, progress, timed):
+		"""
+		Cleans any pending rows, timing it as the batch stage if required.
+		"""
+		if not rows:
+			return
+		started = time.time() if timed else None
+		self._clean_batch(rows, progress)
+		if timed:
+			progress.latencies['batch'] += time.time() - started
+	
+	def _clean_batch(self, rows, progress):
+		"""
+		Runs :meth:`batch_clean` on a batch of parsed rows, then keeps the
+		rows which were not rejected.
+		"""
+		batch = Batch(
+			[parsed for row_number, parsed, hashed in rows],
+			[row_number for row_number, parsed, hashed in rows],
+			self.batch_state,
+		)
+		self.batch_clean(batch)
+		messages = [
+			'Row %s: %s' % (rows[i][0], batch.rejected[i])
+			for i in sorted(batch.rejected)
+		]
+		# Report every rejected row at once, before keeping any of the batch
+		if messages and not self.ignore_errors:
+			raise ValidationError('\n'.join(messages))
+		for message in messages:
+			progress.rows_parsed -= 1
+			progress.errors += 1
+			warnings.warn(message)
+		for i, (row_number, parsed, hashed) in enumerate(rows):
+			if i in batch.rejected:
+				continue
+			self._harvesters += [parsed]
+			if hashed:
+				self._row_hashes += [hashed]
+	
+	def batch_clean(self, batch):
+		"""
+		Called with each :class:`Batch` of up to ``batch_size`` parsed rows.
+		Defaults to calling the harvester's own :meth:`Harvester.batch_clean`.
+		"""
+		self.harvester.batch_clean(batch)
 	
 	def save(self):
-		for harvester in self._harvesters:
-			harvester.save()
+		if self.hash_store is None:
+			for harvester in self._harvesters:
+				harvester.save()
+			return
+		# Only remember a row's hash once it has been saved, so that rows
+		# which failed to save are retried on the next import
+		try:
+			for harvester, (key, digest) in zip(self._harvesters, self._row_hashes):
+				harvester.save()
+				self.hash_store.set(key, digest)
+		finally:
+			self.hash_store.flush()
+	
+	def deleted_keys(self):
+		"""
+		Returns the keys in the hash store which were not found in the file
+		by the last call to :meth:`load`. Only meaningful if the whole file
+		(or shard) was read.
+		"""
+		if self.hash_store is None:
+			raise ConfigurationError(
+				'No hash store defined for processor %s.' % self.__class__.__name__)
+		return [key for key in self.hash_store.keys() if key not in self._seen_keys]
+
+
+class Batch(object):
+	"""
+	A chunk of consecutive parsed rows, as passed to ``batch_clean()``.
+	Behaves as a sequence of the harvester instances, and also gives access
+	to the cleaned values a column at a time.
+	"""
+	
+	def __init__(self, rows, row_numbers, state):
+		"""
+		:param rows: the parsed harvester instances.
+		:param row_numbers: the number of each row in the file.
+		:param state: a :class:`ClassDict` shared by all the batches of a
+			processor, for checks which span batches.
+		"""
+		self.rows = rows
+		self.row_numbers = row_numbers
+		self.state = state
+		self.rejected = {}
+		self._columns = {}
+	
+	def __len__(self):
+		return len(self.rows)
+	
+	def __iter__(self):
+		return iter(self.rows)
+	
+	def __getitem__(self, index):
+		return self.rows[index]
+	
+	def column(self, field_name):
+		"""
+		Returns a list of the cleaned values of the given field, in row order.
+		"""
+		if field_name not in self._columns:
+			self._columns[field_name] = [
+				getattr(row, field_name) for row in self.rows]
+		return self._columns[field_name]
+	
+	def reject(self, index, message):
+		"""
+		Marks the row at the given index of the batch as invalid. Rejected
+		rows are handled like rows failing validation, i.e. they raise a
+		ValidationError unless the processor ignores errors.
+		"""
+		self.rejected[index] = message
+
+
+# Model instances created to check for instance-only attributes, cached per
+# model class so each model is only instantiated once however many harvesters
+# use it. Harvesters imported before forking workers share this cache.
+_model_instances = {}
+
+def _model_has_attribute(model, name):
+	if hasattr(model, name):
+		return True
+	if model not in _model_instances:
+		_model_instances[model] = model()
+	return hasattr(_model_instances[model], name)
 
 
 class HarvesterBase(type):
@@ -85,11 +419,29 @@ class HarvesterBase(type):
 				# Insert the field into its spot in the list
 				fields.insert(idx, value)
 		klass._meta.fields = odict((f.name, f) for f in fields)
+		# Precompute what Harvester.__init__ needs for every row
+		klass._meta.file_fields = [(f.name, f) for f in fields if f.in_file]
+		klass._meta.column_count = sum(f.colspan for f in fields if f.in_file)
 		# If it's not the Harvester class defined below, validate it
 		if attrs['__module__'] != __name__:
 			klass._validate()
 		return klass
 	
+	def _columns(self, field_name):
+		"""
+		Returns a slice of the columns in a row which hold the values of the
+		given field.
+		"""
+		start = 0
+		for name, field in self._meta.file_fields:
+			if name == field_name:
+				return slice(start, start + field.colspan)
+			start += field.colspan
+		raise ConfigurationError(
+			'%s has no field named "%s" in the file.' % (
+				self.__name__, field_name,
+		))
+	
 	def _validate(self):
 		"""
 		Gets called at class definition time, throws ConfigurationErrors if a
@@ -111,8 +463,7 @@ class HarvesterBase(type):
 			# avoid a hard dependency with Django.
 			if field.in_model \
 			and 'model' in self._meta \
-			and not (hasattr(self._meta.model, field_name)
-			or hasattr(self._meta.model(), field_name)):
+			and not _model_has_attribute(self._meta.model, field_name):
 				raise ConfigurationError(
 					'The model %s does not have an attribute named %s, which '
 					'was defined in the %s harvester.' % (
@@ -140,10 +491,7 @@ class Harvester(object):
 		"""
 		# Validate the number of columns in data against the number of fields
 		# expected by this harvester and warn as necessary
-		count_difference = len(data) - reduce(
-			operator.add,
-			[f.colspan for f in self._meta.fields.values() if f.in_file]
-		)
+		count_difference = len(data) - self._meta.column_count
 		if count_difference < 0:
 			warnings.warn(
 				'Number of columns defined in harvester exceeds the number of '
@@ -163,9 +511,7 @@ class Harvester(object):
 		
 		# Parse the provided data and load into the raw data store
 		row = data.__iter__()
-		for field_name, field in self._meta.fields.items():
-			if not field.in_file:
-				continue
+		for field_name, field in self._meta.file_fields:
 			# Raw data store values are always lists for consistency across
 			# single- and multi- column fields
 			if field_name not in self._data.raw:
@@ -328,6 +674,15 @@ class Harvester(object):
 		all the individual fields have been validated.
 		"""
 		pass
+	
+	@classmethod
+	def batch_clean(cls, batch):
+		"""
+		This method can be overriden to implement cross-row validation, such as
+		uniqueness checks, on each :class:`Batch` of parsed rows. Invalid rows
+		can be rejected with ``batch.reject(index, message)``.
+		"""
+		pass
 
 """
 The idea is that field.clean() is mostly for validation, and making sure that it's
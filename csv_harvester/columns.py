@@ -1,5 +1,3 @@
-import decimal
-
 from . import constants
 
 
@@ -132,7 +130,9 @@ class _NumericField(Field):
 	def clean(self, data):
 		try:
 			data = self.datatype(data)
-		except (ValueError, TypeError, decimal.InvalidOperation):
+		# decimal.InvalidOperation is an ArithmeticError, catching that avoids
+		# importing decimal unless a DecimalField is actually used
+		except (ValueError, TypeError, ArithmeticError):
 			# For empty (or otherwise False) strings, pass it up for checking
 			# against the blank and default parameters.
 			if not data:
@@ -150,7 +150,15 @@ class FloatField(_NumericField):
 	datatype = float
 
 class DecimalField(_NumericField):
-	datatype = decimal.Decimal
+	_datatype = None
+	
+	@property
+	def datatype(self):
+		# Cached, so that the lazy import only runs once
+		if DecimalField._datatype is None:
+			import decimal
+			DecimalField._datatype = decimal.Decimal
+		return DecimalField._datatype
 
 
 # OTHER DATA TYPES
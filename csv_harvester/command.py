@@ -2,11 +2,20 @@ import os
 from optparse import make_option, OptionError
 from django.core.management.base import BaseCommand
 
+from . import constants
+from .utils import parse_shard
+
 class CSVHarvestCommand(BaseCommand):
 	processor = None
 	option_list = BaseCommand.option_list + (
 		make_option('--csv', action='store', dest='csv_path', help='The path to the CSV file to import.'),
 		make_option('--validate', action='store_true', dest='validate', default=False, help='Validate only, do not save.'),
+		make_option('--shard', action='store', dest='shard', help='Only import shard i of n, given as "i/n" with i counting from 0.'),
+		make_option('--shard-strategy', action='store', dest='shard_strategy', default=constants.SHARD_BY_BYTES,
+			choices=[constants.SHARD_BY_BYTES, constants.SHARD_BY_KEY],
+			help='Split the file by byte range ("bytes"), which needs one row per line and fails on cells containing '
+			'line breaks, or by a hash of the shard key ("key").'),
+		make_option('--shard-key', action='store', dest='shard_key', help='The harvester field to hash when sharding by key.'),
 		)
 	help = 'Parse the CSV file and populate the database.'
 
@@ -16,9 +25,18 @@ class CSVHarvestCommand(BaseCommand):
 			raise OptionError('Please provide the path to the CSV file to import.', '--csv')
 		if not os.access(csv_path, os.R_OK):
 			raise IOError('The CSV file "%s" could not be opened.' % csv_path)
-		if not self.processor or not hasattr(self.processor, 'parse'):
+		if not self.processor or not hasattr(self.processor, 'load'):
 			raise ValueError('No valid harvest processor was specified.')
-		self.processor.parse(csv_path)
+		shard = options.get('shard', None)
+		if shard:
+			try:
+				self.processor.shard = parse_shard(shard)
+			except ValueError, e:
+				raise OptionError(e.message, '--shard')
+			self.processor.shard_strategy = options.get('shard_strategy', constants.SHARD_BY_BYTES)
+			if options.get('shard_key', None):
+				self.processor.shard_key = options['shard_key']
+		self.processor.load(csv_path)
 		if not options.get('validate', False):
 			self.processor.save()
 			
\ No newline at end of file
@@ -4,6 +4,11 @@ DEFAULTS_LAST = 0
 DEFAULTS_FIRST = 1
 DEFAULTS_IGNORE = 2
 
+# Strategies for splitting a file across several import workers, see
+# Processor.shard
+SHARD_BY_BYTES = 'bytes'
+SHARD_BY_KEY = 'key'
+
 # Used for decyphering boolean columns
 TRUE_VALUES = ('y', 'yes', 't', 'true', '1')
 FALSE_VALUES = ('n', 'no', 'f', 'false', '0')
@@ -0,0 +1,119 @@
+import os
+
+
+class HashStore(object):
+	"""
+	Remembers the content hash of each row saved by a :class:`Processor`,
+	keyed on the row's natural key, so that unchanged rows can be skipped on
+	the next import. Subclasses implement :meth:`_read` and :meth:`_write` to
+	load and persist the hashes.
+
+	When sharding by key, each shard needs its own store, and the shard count
+	must not change between imports, otherwise keys move to shards whose
+	stores know nothing about them.
+	"""
+
+	def __init__(self):
+		self._hashes = None
+		# Hashes set since the last flush, for keys that were not stored yet
+		# and for keys whose stored hash changed
+		self._new = {}
+		self._changed = {}
+
+	@property
+	def hashes(self):
+		if self._hashes is None:
+			self._hashes = self._read()
+		return self._hashes
+
+	def get(self, key):
+		return self.hashes.get(key)
+
+	def set(self, key, digest):
+		stored = self.hashes.get(key)
+		if stored == digest:
+			return
+		if stored is None or key in self._new:
+			self._new[key] = digest
+		else:
+			self._changed[key] = digest
+		self.hashes[key] = digest
+
+	def keys(self):
+		return self.hashes.keys()
+
+	def flush(self):
+		"""
+		Persists the hashes set since the last flush.
+		"""
+		if self._new or self._changed:
+			self._write(self._new, self._changed)
+			self._new = {}
+			self._changed = {}
+
+	def _read(self):
+		"""
+		:returns: a dictionary of the stored hashes, keyed on the row keys.
+		"""
+		raise NotImplementedError
+
+	def _write(self, new, changed):
+		"""
+		:param new: a dictionary of the hashes for keys not stored before.
+		:param changed: a dictionary of the hashes which replace stored ones.
+		"""
+		raise NotImplementedError
+
+
+class FileHashStore(HashStore):
+	"""
+	Keeps the hashes in a local pickle file, which is rewritten on flush.
+	"""
+
+	def __init__(self, path):
+		import cPickle
+		self._pickle = cPickle
+		self.path = path
+		super(FileHashStore, self).__init__()
+
+	def _read(self):
+		if not os.path.exists(self.path):
+			return {}
+		with open(self.path, 'rb') as source:
+			return self._pickle.load(source)
+
+	def _write(self, new, changed):
+		# Write to a temporary file first, so that an interrupted flush does
+		# not leave a truncated store behind
+		temp_path = '%s.tmp' % self.path
+		with open(temp_path, 'wb') as target:
+			self._pickle.dump(
+				self.hashes, target, self._pickle.HIGHEST_PROTOCOL)
+		os.rename(temp_path, self.path)
+
+
+class ModelHashStore(HashStore):
+	"""
+	Keeps the hashes in a Django model (or similar object) with a field for
+	the row key and another for its hash.
+	"""
+
+	def __init__(self, model, key_field='key', hash_field='hash'):
+		self.model = model
+		self.key_field = key_field
+		self.hash_field = hash_field
+		super(ModelHashStore, self).__init__()
+
+	def _read(self):
+		return dict(self.model.objects.values_list(
+			self.key_field, self.hash_field))
+
+	def _write(self, new, changed):
+		if new:
+			self.model.objects.bulk_create([
+				self.model(**{self.key_field: key, self.hash_field: digest})
+				for key, digest in new.items()
+			])
+		for key, digest in changed.items():
+			self.model.objects.filter(
+				**{self.key_field: key}).update(**{self.hash_field: digest})
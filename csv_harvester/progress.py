@@ -0,0 +1,147 @@
+import sys
+import time
+
+from .utils import ClassDict
+
+
+class ProgressTracker(object):
+	"""
+	Keeps the running counters for a :meth:`Processor.load` call and fires the
+	progress callbacks every ``every_rows`` rows and/or ``every_seconds``
+	seconds, plus once more when the load finishes.
+
+	Each callback receives a :class:`ClassDict` snapshot with the following
+	keys:
+
+		**rows_read**, **rows_parsed**, **rows_unchanged**, **errors**: the
+		row counters so far, unchanged rows being those skipped by an
+		incremental load.
+		**bytes_read**, **total_bytes**: how much of the file was consumed.
+		**elapsed**: seconds since the load started.
+		**rate**: rows/sec since the previous report.
+		**average_rate**: rows/sec since the load started.
+		**eta**: estimated seconds left, based on the bytes left to read.
+		**latencies**: average seconds per row spent in each stage, i.e.
+		``read`` (file reading, decoding and tokenising) and ``parse``
+		(building and cleaning the harvester) and ``batch`` (running
+		``batch_clean()``).
+		**finished**: True for the final report.
+	"""
+
+	def __init__(self, callbacks, every_rows=None, every_seconds=None,
+			total_bytes=None):
+		self.callbacks = list(callbacks)
+		self.every_rows = every_rows
+		self.every_seconds = every_seconds
+		self.total_bytes = total_bytes
+		self.rows_read = 0
+		self.rows_parsed = 0
+		self.rows_unchanged = 0
+		self.errors = 0
+		self.bytes_read = 0
+		self.latencies = {'read': 0.0, 'parse': 0.0, 'batch': 0.0}
+
+	def start(self):
+		self._started = self._last_time = time.time()
+		self._last_rows = 0
+		# The row count at which the next row-based report is due
+		self._next_rows = self.every_rows or None
+
+	def due(self, now):
+		"""
+		Cheap check, meant to be called once per row, of whether a report
+		should be fired.
+		"""
+		if self._next_rows is not None and self.rows_read >= self._next_rows:
+			return True
+		return bool(self.every_seconds) \
+			and now - self._last_time >= self.every_seconds
+
+	def report(self, now=None, finished=False):
+		now = now or time.time()
+		elapsed = now - self._started
+		interval = now - self._last_time
+		rate = (self.rows_read - self._last_rows) / interval if interval else 0.0
+		average_rate = self.rows_read / elapsed if elapsed else 0.0
+		eta = None
+		if self.total_bytes and self.bytes_read and not finished:
+			remaining = max(self.total_bytes - self.bytes_read, 0)
+			eta = elapsed * remaining / float(self.bytes_read)
+		rows = float(self.rows_read or 1)
+		snapshot = ClassDict(defaults={
+			'rows_read': self.rows_read,
+			'rows_parsed': self.rows_parsed,
+			'rows_unchanged': self.rows_unchanged,
+			'errors': self.errors,
+			'bytes_read': self.bytes_read,
+			'total_bytes': self.total_bytes,
+			'elapsed': elapsed,
+			'rate': rate,
+			'average_rate': average_rate,
+			'eta': eta,
+			'latencies': dict(
+				(stage, total / rows) for stage, total in self.latencies.items()),
+			'finished': finished,
+		})
+		self._last_time = now
+		self._last_rows = self.rows_read
+		if self.every_rows:
+			self._next_rows = self.rows_read + self.every_rows
+		for callback in self.callbacks:
+			callback(snapshot)
+
+
+class ConsoleReporter(object):
+	"""
+	A progress callback that prints a human readable status line, at most once
+	every ``min_interval`` seconds. The final report is always printed.
+	"""
+
+	def __init__(self, min_interval=1.0, stream=None):
+		self.min_interval = min_interval
+		self.stream = stream or sys.stderr
+		self._last = None
+
+	def __call__(self, progress):
+		now = time.time()
+		if not progress.finished and self._last is not None \
+		and now - self._last < self.min_interval:
+			return
+		self._last = now
+		if progress.total_bytes:
+			done = '%.1f%%' % (100.0 * progress.bytes_read / progress.total_bytes)
+		else:
+			done = '%s bytes' % progress.bytes_read
+		eta = '%ds' % progress.eta if progress.eta is not None else '-'
+		self.stream.write(
+			'%s rows read, %s parsed, %s errors, %s, %.0f rows/s '
+			'(avg %.0f rows/s), ETA %s\n' % (
+				progress.rows_read, progress.rows_parsed, progress.errors, done,
+				progress.rate, progress.average_rate, eta,
+		))
+		self.stream.flush()
+
+
+class JSONLinesReporter(object):
+	"""
+	A progress callback that writes each report as a JSON object on its own
+	line, to a file-like object or to a file at the given path. Call
+	:meth:`close` when done to close a file opened from a path.
+	"""
+
+	def __init__(self, stream):
+		import json
+		self._dumps = json.dumps
+		self._owns_stream = isinstance(stream, basestring)
+		if self._owns_stream:
+			stream = open(stream, 'a')
+		self.stream = stream
+
+	def __call__(self, progress):
+		progress = dict(progress, timestamp=time.time())
+		self.stream.write(self._dumps(progress, sort_keys=True) + '\n')
+		self.stream.flush()
+
+	def close(self):
+		if self._owns_stream:
+			self.stream.close()
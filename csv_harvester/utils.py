@@ -1,4 +1,8 @@
 import csv
+import os
+import sys
+
+from .constants import ConfigurationError
 
 # Try to find an available ordered dictionary implementation
 try:
@@ -42,6 +46,25 @@ class ClassDict(dict):
         self[item] = value
 
 
+class BoundedDict(odict):
+    """
+    An ordered dictionary holding at most ``maxlen`` items, which forgets the
+    oldest items first. Useful for keeping state across batches, e.g. the
+    recently seen keys for a uniqueness check.
+    """
+
+    def __init__(self, maxlen, *args, **kwargs):
+        self.maxlen = maxlen
+        super(BoundedDict, self).__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if key in self:
+            del self[key]
+        super(BoundedDict, self).__setitem__(key, value)
+        while len(self) > self.maxlen:
+            self.popitem(last=False)
+
+
 class UTF8Recoder(object):
     def __init__(self, source, encoding):
         self._source = source
@@ -49,18 +72,45 @@ class UTF8Recoder(object):
     def __iter__(self):
         return self
     def next(self):
-        return self._source.next().decode(self._encoding).encode('utf-8')
+        # readline() rather than next() so that the source's tell() stays
+        # accurate, as file iteration uses its own read-ahead buffer
+        line = self._source.readline()
+        if not line:
+            raise StopIteration
+        return line.decode(self._encoding).encode('utf-8')
 
 class CSVReader(object):
     """
     An encoding-aware CSV reader.
+
+    With ``read_ahead=True``, the file is read, decoded and tokenised by a
+    background thread, which hands over batches of ``read_ahead_rows`` rows
+    through a buffer of at most ``read_ahead_batches`` batches, so that slow
+    reads overlap with the processing of the rows already read.
+
+    Pipes and other non-seekable sources can be read, but not positioned
+    with :meth:`seek` or :meth:`tell`; see :attr:`seekable`.
     """
 
     def __init__(self, filename, **params):
         encoding = params.pop('encoding', 'utf-8')
-        self._source = open(filename, mode='Urb')
+        self._read_ahead = params.pop('read_ahead', False)
+        self._read_ahead_rows = params.pop('read_ahead_rows', 1000)
+        self._read_ahead_batches = params.pop('read_ahead_batches', 4)
+        if self._read_ahead:
+            # Read in large blocks to make the most of each trip to the disk
+            self._source = open(filename, 'Urb', 1024 * 1024)
+        else:
+            self._source = open(filename, mode='Urb')
+        self.size = os.path.getsize(filename)
+        try:
+            self._source.tell()
+            self.seekable = True
+        except IOError:
+            self.seekable = False
         self._reader = csv.reader(
             UTF8Recoder(self._source, encoding), **params)
+        self._thread = None
 
     def __iter__(self):
         return self
@@ -72,7 +122,180 @@ class CSVReader(object):
         self.close()
     
     def next(self):
+        if self._read_ahead:
+            return self._next_read_ahead()
         return [unicode(cell, 'utf-8') for cell in self._reader.next()]
+
+    def _next_read_ahead(self):
+        # The thread is started on the first read, so that seek() can still
+        # be used beforehand
+        if self._thread is None:
+            self._start_read_ahead()
+        if self._index >= len(self._batch):
+            if self._finished:
+                raise StopIteration
+            batch = self._get()
+            if isinstance(batch, tuple):
+                self._finished = True
+                raise batch[0], batch[1], batch[2]
+            if batch is None:
+                self._finished = True
+                raise StopIteration
+            self._batch = batch
+            self._index = 0
+        row, self._position, self._line_number = self._batch[self._index]
+        self._index += 1
+        return row
+
+    def _start_read_ahead(self):
+        import Queue
+        import threading
+        self._queue = Queue.Queue(self._read_ahead_batches)
+        self._queue_full = Queue.Full
+        self._queue_empty = Queue.Empty
+        self._stopped = threading.Event()
+        self._batch = []
+        self._index = 0
+        self._position = self._source.tell() if self.seekable else None
+        self._line_number = self._reader.line_num
+        self._finished = False
+        self._thread = threading.Thread(target=self._fill)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _fill(self):
+        """
+        Runs in the background thread, queueing lists of (row, offset after
+        the row, line number) tuples, then either None at the end of the file
+        or the exc_info of any error raised while reading.
+        """
+        seekable = self.seekable
+        batch = []
+        try:
+            while not self._stopped.is_set():
+                batch = []
+                for cells in self._reader:
+                    batch.append((
+                        [unicode(cell, 'utf-8') for cell in cells],
+                        self._source.tell() if seekable else None,
+                        self._reader.line_num,
+                    ))
+                    if len(batch) >= self._read_ahead_rows:
+                        break
+                if not batch:
+                    break
+                self._put(batch)
+            self._put(None)
+        except Exception:
+            error = sys.exc_info()
+            # Hand over the rows read before the error first, as the plain
+            # reader would have returned them
+            if batch:
+                self._put(batch)
+            self._put(error)
+
+    def _get(self):
+        # Wait with a timeout, as on Python 2 a blocking get() cannot be
+        # interrupted, e.g. by Ctrl-C while the storage stalls
+        while True:
+            try:
+                return self._queue.get(timeout=0.1)
+            except self._queue_empty:
+                pass
+
+    def _put(self, item):
+        # Give up if the reader gets closed while waiting for the consumer
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except self._queue_full:
+                pass
     
+    def seek(self, offset):
+        """
+        Moves to the start of the first line beginning at or after the given
+        byte offset.
+        """
+        if not self.seekable:
+            raise IOError('%s is not seekable.' % self._source.name)
+        if offset <= 0:
+            self._source.seek(0)
+            return
+        # Step back one byte, so that a line starting exactly at the offset is
+        # not skipped, and discard the rest of the current line
+        self._source.seek(offset - 1)
+        self._source.readline()
+
+    @property
+    def line_number(self):
+        """
+        The number of physical lines read so far, which is more than the
+        number of rows if any quoted cells contain line breaks.
+        """
+        if self._thread is not None:
+            return self._line_number
+        return self._reader.line_num
+
+    def tell(self):
+        """
+        Returns the byte offset in the file up to which rows have been read.
+        """
+        if not self.seekable:
+            raise IOError('%s is not seekable.' % self._source.name)
+        if self._thread is not None:
+            return self._position
+        return self._source.tell()
+
     def close(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
         self._source.close()
+
+
+def count_lines(filename, end, block_size=1024 * 1024):
+    """
+    Counts the line breaks in the first ``end`` bytes of a file, without
+    decoding it. As with the universal newline mode used by CSVReader, any of
+    "\\n", "\\r\\n" and "\\r" count as one line break.
+    """
+    count = 0
+    previous = ''
+    with open(filename, 'rb') as source:
+        while end > 0:
+            block = source.read(min(block_size, end))
+            if not block:
+                break
+            count += block.count('\n') + block.count('\r') \
+                - block.count('\r\n')
+            # A "\r\n" split across two blocks was counted twice
+            if previous == '\r' and block[0] == '\n':
+                count -= 1
+            previous = block[-1]
+            end -= len(block)
+    return count
+
+
+def parse_shard(value):
+    """
+    Converts a shard specification, i.e. the zero-based index of this shard
+    out of n shards given either as an "i/n" string or an ``(i, n)`` tuple,
+    into a validated ``(i, n)`` tuple.
+    """
+    try:
+        if isinstance(value, basestring):
+            value = value.split('/')
+        index, count = [int(part) for part in value]
+    except (ValueError, TypeError):
+        raise ConfigurationError(
+            'Invalid shard %r, expected "i/n" or (i, n).' % (value,))
+    if count < 1:
+        raise ConfigurationError(
+            'Invalid shard %s/%s, the count must be at least 1.'
+            % (index, count))
+    if not 0 <= index < count:
+        raise ConfigurationError(
+            'Invalid shard %s/%s, the index must be between 0 and %s.'
+            % (index, count, count - 1))
+    return index, count
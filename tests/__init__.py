@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import csv_harvester
+
+
+class HarvesterTestCase(unittest.TestCase):
+	"""
+	Runs each test with a temporary directory for its CSV files, and builds
+	processors for the ``harvester`` attribute of the test case.
+	"""
+	harvester = None
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def write(self, lines, newline='\n', name='items.csv'):
+		"""
+		Writes the given lines to a file in the temporary directory, and
+		returns its path.
+		"""
+		path = os.path.join(self.directory, name)
+		with open(path, 'wb') as target:
+			target.write(''.join(line + newline for line in lines))
+		return path
+
+	def processor(self, **attrs):
+		"""
+		Returns an instance of a Processor subclass for the test's harvester,
+		with the given class attributes.
+		"""
+		attrs.setdefault('harvester', self.harvester)
+		return type('ItemProcessor', (csv_harvester.Processor,), attrs)()
+
+	def load(self, path, **attrs):
+		processor = self.processor(**attrs)
+		processor.load(path)
+		return processor
+
+	def ids(self, processor):
+		return [harvester.id for harvester in processor._harvesters]
@@ -0,0 +1,55 @@
+import unittest
+import warnings
+
+import csv_harvester
+from csv_harvester import columns
+
+from . import HarvesterTestCase
+
+
+class ItemHarvester(csv_harvester.Harvester):
+	id = columns.IntegerField()
+
+	@classmethod
+	def batch_clean(cls, batch):
+		seen = batch.state.setdefault('seen', csv_harvester.BoundedDict(100))
+		for i, value in enumerate(batch.column('id')):
+			if value in seen:
+				batch.reject(i, 'Duplicate of row %s.' % seen[value])
+			else:
+				seen[value] = batch.row_numbers[i]
+
+
+class BatchCleanTest(HarvesterTestCase):
+	harvester = ItemHarvester
+
+	def setUp(self):
+		super(BatchCleanTest, self).setUp()
+		self.path = self.write(['1', '2', '1', '3', '2'])
+
+	def test_rejected_rows_are_dropped(self):
+		with warnings.catch_warnings(record=True):
+			warnings.simplefilter('always')
+			processor = self.load(self.path, ignore_errors=True)
+		self.assertEqual(self.ids(processor), [1, 2, 3])
+
+	def test_all_rejections_raised_before_keeping_rows(self):
+		processor = self.processor(ignore_errors=False)
+		try:
+			processor.load(self.path)
+		except csv_harvester.ValidationError, e:
+			self.assertEqual(str(e),
+				'Row 3: Duplicate of row 1.\nRow 5: Duplicate of row 2.')
+		else:
+			self.fail('No ValidationError raised.')
+		self.assertEqual(processor._harvesters, [])
+
+	def test_rejected_rows_do_not_count_towards_rows_to_read(self):
+		with warnings.catch_warnings(record=True):
+			warnings.simplefilter('always')
+			processor = self.load(self.path, ignore_errors=True, rows_to_read=3)
+		self.assertEqual(self.ids(processor), [1, 2, 3])
+
+
+if __name__ == '__main__':
+	unittest.main()
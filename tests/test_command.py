@@ -0,0 +1,45 @@
+import unittest
+
+import csv_harvester
+from csv_harvester import columns, constants
+
+from . import HarvesterTestCase
+
+try:
+	from django.conf import settings
+except ImportError:
+	settings = None
+else:
+	if not settings.configured:
+		settings.configure()
+	from csv_harvester.command import CSVHarvestCommand
+
+
+class ItemHarvester(csv_harvester.Harvester):
+	id = columns.IntegerField()
+	name = columns.TextField()
+
+
+@unittest.skipIf(settings is None, 'Django is not installed.')
+class CommandTest(HarvesterTestCase):
+	harvester = ItemHarvester
+
+	def test_shard_options_reach_the_processor(self):
+		path = self.write(['%s,name %s' % (i, i % 5) for i in range(20)])
+		ids = []
+		for index in range(3):
+			command = CSVHarvestCommand()
+			command.processor = self.processor()
+			command.handle(
+				csv_path=path, validate=True, shard='%s/3' % index,
+				shard_strategy=constants.SHARD_BY_KEY, shard_key='name')
+			self.assertEqual(command.processor.shard, (index, 3))
+			self.assertEqual(
+				command.processor.shard_strategy, constants.SHARD_BY_KEY)
+			self.assertEqual(command.processor.shard_key, 'name')
+			ids += self.ids(command.processor)
+		self.assertEqual(sorted(ids), range(20))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,116 @@
+import os
+import unittest
+
+import csv_harvester
+from csv_harvester import columns, constants
+
+from . import HarvesterTestCase
+
+
+class Item(object):
+	id = name = None
+
+	def save(self):
+		pass
+
+
+class ItemHarvester(csv_harvester.Harvester):
+	id = columns.IntegerField()
+	name = columns.TextField()
+
+	class Meta:
+		model = Item
+
+
+class IncrementalTest(HarvesterTestCase):
+	harvester = ItemHarvester
+
+	def setUp(self):
+		super(IncrementalTest, self).setUp()
+		self.path = self.write(['%s,name %s' % (i, i) for i in range(100)])
+
+	def load_and_save(self):
+		reports = []
+		processor = self.load(
+			self.path,
+			hash_store=csv_harvester.FileHashStore(
+				os.path.join(self.directory, 'hashes')),
+			incremental_key='id',
+			progress_every_rows=10,
+			progress_callbacks=[reports.append],
+		)
+		processor.save()
+		return reports
+
+	def test_progress_reported_for_unchanged_rows(self):
+		self.load_and_save()
+		reports = self.load_and_save()
+		self.assertEqual(
+			[report.rows_read for report in reports],
+			[10, 20, 30, 40, 50, 60, 70, 80, 90, 100, 100])
+		self.assertEqual(reports[-1].rows_unchanged, 100)
+		self.assertEqual(reports[-1].rows_parsed, 0)
+
+	def test_sharding_restricted_to_incremental_key(self):
+		store = csv_harvester.FileHashStore(
+			os.path.join(self.directory, 'hashes'))
+		for attrs in (
+				{'shard': (0, 2)},
+				{'shard': (0, 2), 'shard_strategy': constants.SHARD_BY_KEY,
+					'shard_key': 'name'}):
+			self.assertRaises(
+				constants.ConfigurationError, self.load, self.path,
+				hash_store=store, incremental_key='id', **attrs)
+		processor = self.load(
+			self.path, hash_store=store, incremental_key='id', shard=(0, 2),
+			shard_strategy=constants.SHARD_BY_KEY, shard_key='id')
+		self.assertTrue(0 < len(processor._harvesters) < 100)
+
+
+class FakeManager(object):
+	"""
+	Records the queries a ModelHashStore makes, in place of a Django manager.
+	"""
+
+	def __init__(self, rows):
+		self.rows = rows
+		self.queries = []
+
+	def values_list(self, *fields):
+		return self.rows.items()
+
+	def bulk_create(self, objects):
+		self.queries.append(('insert', sorted(obj.key for obj in objects)))
+
+	def filter(self, key):
+		manager = self
+		class QuerySet(object):
+			def update(self, hash):
+				manager.queries.append(('update', key))
+		return QuerySet()
+
+
+class HashRow(object):
+	def __init__(self, key, hash):
+		self.key = key
+		self.hash = hash
+
+
+class ModelHashStoreTest(unittest.TestCase):
+	def test_only_changed_keys_are_updated(self):
+		HashRow.objects = FakeManager({'a': '1', 'b': '2'})
+		store = csv_harvester.ModelHashStore(HashRow)
+		store.set('a', '1')
+		store.set('b', '3')
+		store.set('c', '4')
+		store.set('d', '5')
+		store.set('d', '6')
+		store.flush()
+		self.assertEqual(HashRow.objects.queries, [
+			('insert', ['c', 'd']),
+			('update', 'b'),
+		])
+
+
+if __name__ == '__main__':
+	unittest.main()
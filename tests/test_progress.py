@@ -0,0 +1,107 @@
+import json
+import os
+import StringIO
+import time
+import unittest
+
+import csv_harvester
+from csv_harvester import columns
+from csv_harvester.progress import ProgressTracker
+from csv_harvester.utils import ClassDict
+
+from . import HarvesterTestCase
+
+
+class ItemHarvester(csv_harvester.Harvester):
+	id = columns.IntegerField()
+	name = columns.TextField()
+
+
+def snapshot(**values):
+	progress = ClassDict(defaults={
+		'rows_read': 10, 'rows_parsed': 10, 'errors': 0, 'bytes_read': 50,
+		'total_bytes': 100, 'rate': 1.0, 'average_rate': 1.0, 'eta': 5.0,
+		'finished': False,
+	})
+	progress.update(values)
+	return progress
+
+
+class ProgressTest(HarvesterTestCase):
+	harvester = ItemHarvester
+
+	def setUp(self):
+		super(ProgressTest, self).setUp()
+		self.path = self.write(['%s,name %s' % (i, i) for i in range(100)])
+
+	def load_reports(self, **attrs):
+		reports = []
+		self.load(self.path, progress_callbacks=[reports.append], **attrs)
+		return reports
+
+	def test_every_seconds(self):
+		tracker = ProgressTracker([], every_seconds=10)
+		tracker.start()
+		now = time.time()
+		self.assertFalse(tracker.due(now + 5))
+		self.assertTrue(tracker.due(now + 11))
+		tracker.report(now + 11)
+		self.assertFalse(tracker.due(now + 15))
+		self.assertTrue(tracker.due(now + 22))
+		# The time based check works on its own during a load too
+		reports = self.load_reports(
+			progress_every_rows=None, progress_every_seconds=1e-9)
+		self.assertEqual(len(reports), 101)
+
+	def test_final_report(self):
+		reports = self.load_reports(progress_every_rows=30)
+		self.assertEqual(
+			[(report.rows_read, report.finished) for report in reports],
+			[(30, False), (60, False), (90, False), (100, True)])
+		self.assertEqual(reports[-1].rows_parsed, 100)
+		self.assertEqual(reports[-1].eta, None)
+
+	def test_bytes_on_a_byte_shard(self):
+		size = os.path.getsize(self.path)
+		reports = self.load_reports(progress_every_rows=10, shard=(1, 2))
+		total = reports[-1].total_bytes
+		# The second shard starts at the first line past the middle
+		self.assertTrue(size / 2 - 10 < total <= size / 2)
+		self.assertEqual(reports[-1].bytes_read, total)
+		for report in reports[:-1]:
+			self.assertTrue(0 < report.bytes_read < total)
+			self.assertTrue(report.eta is not None and report.eta >= 0)
+
+	def test_console_reporter_rate_limited(self):
+		stream = StringIO.StringIO()
+		reporter = csv_harvester.ConsoleReporter(min_interval=60, stream=stream)
+		reporter(snapshot(rows_read=10))
+		reporter(snapshot(rows_read=20))
+		reporter(snapshot(rows_read=30, finished=True, eta=None))
+		lines = stream.getvalue().splitlines()
+		self.assertEqual(len(lines), 2)
+		self.assertTrue(lines[0].startswith('10 rows read'))
+		self.assertTrue(lines[1].startswith('30 rows read'))
+		self.assertTrue(lines[1].endswith('ETA -'))
+
+	def test_json_lines_reporter(self):
+		path = os.path.join(self.directory, 'progress.jsonl')
+		reporter = csv_harvester.JSONLinesReporter(path)
+		reporter(snapshot(rows_read=10))
+		reporter(snapshot(rows_read=20, finished=True))
+		reporter.close()
+		self.assertTrue(reporter.stream.closed)
+		with open(path) as source:
+			reports = [json.loads(line) for line in source]
+		self.assertEqual([report['rows_read'] for report in reports], [10, 20])
+		self.assertEqual(reports[1]['finished'], True)
+		self.assertTrue('timestamp' in reports[0])
+		# Streams passed in are left open for their owner to close
+		stream = StringIO.StringIO()
+		reporter = csv_harvester.JSONLinesReporter(stream)
+		reporter.close()
+		self.assertFalse(stream.closed)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,105 @@
+import os
+import threading
+import unittest
+
+import csv_harvester
+from csv_harvester import columns, constants
+from csv_harvester.utils import CSVReader
+
+from . import HarvesterTestCase
+
+
+class ItemHarvester(csv_harvester.Harvester):
+	id = columns.IntegerField()
+	name = columns.TextField()
+
+
+class ReadAheadTest(HarvesterTestCase):
+	harvester = ItemHarvester
+
+	def rows(self, path, **params):
+		with CSVReader(path, **params) as reader:
+			return list(reader)
+
+	def fifo(self, lines):
+		"""
+		Returns the path to a named pipe, fed the given lines by a thread.
+		"""
+		source = self.write(lines, name='source.csv')
+		path = os.path.join(
+			self.directory, 'pipe%s.csv' % len(os.listdir(self.directory)))
+		os.mkfifo(path)
+		def feed():
+			with open(source, 'rb') as data:
+				with open(path, 'wb') as pipe:
+					pipe.write(data.read())
+		writer = threading.Thread(target=feed)
+		writer.daemon = True
+		writer.start()
+		return path
+
+	def test_rows_match_plain_reader(self):
+		path = self.write(['%s,"name, %s"' % (i, i) for i in range(100)])
+		expected = self.rows(path)
+		# Batch sizes which do and don't divide the row count
+		for batch_rows in (1, 7, 10, 100, 1000):
+			self.assertEqual(self.rows(
+				path, read_ahead=True, read_ahead_rows=batch_rows,
+				read_ahead_batches=2), expected)
+
+	def test_decode_errors_reach_the_caller(self):
+		path = self.write(['1,name 1', '2,caf\xe9'])
+		reader = CSVReader(path, read_ahead=True)
+		try:
+			self.assertEqual(reader.next(), [u'1', u'name 1'])
+			self.assertRaises(UnicodeDecodeError, reader.next)
+		finally:
+			reader.close()
+
+	def test_close_joins_the_thread(self):
+		path = self.write(['%s,name %s' % (i, i) for i in range(100)])
+		reader = CSVReader(
+			path, read_ahead=True, read_ahead_rows=1, read_ahead_batches=1)
+		reader.next()
+		reader.close()
+		self.assertFalse(reader._thread.is_alive())
+		# Including when a load stops early on rows_to_read, with the thread
+		# waiting for room in the buffer
+		threads = threading.active_count()
+		processor = self.load(
+			path, read_ahead=True, rows_to_read=3)
+		self.assertEqual(self.ids(processor), [0, 1, 2])
+		self.assertEqual(threading.active_count(), threads)
+
+	def test_byte_shards_cover_every_row_once(self):
+		path = self.write(['id,name'] + ['%s,name %s' % (i, i) for i in range(100)])
+		for count in (1, 3, 7):
+			ids = []
+			for index in range(count):
+				ids += self.ids(self.load(
+					path, read_ahead=True, row_offset=1, shard=(index, count)))
+			self.assertEqual(sorted(ids), range(100))
+
+	@unittest.skipIf(not hasattr(os, 'mkfifo'), 'Named pipes are not available.')
+	def test_non_seekable_source(self):
+		lines = ['%s,name %s' % (i, i) for i in range(50)]
+		expected = self.rows(self.write(lines))
+		path = self.fifo(lines)
+		with CSVReader(path, read_ahead=True, read_ahead_rows=7) as reader:
+			self.assertFalse(reader.seekable)
+			self.assertEqual(list(reader), expected)
+			self.assertRaises(IOError, reader.tell)
+		# Progress reporting carries on without byte positions
+		reports = []
+		processor = self.load(
+			self.fifo(lines), read_ahead=True,
+			progress_callbacks=[reports.append])
+		self.assertEqual(self.ids(processor), range(50))
+		self.assertEqual(reports[-1].bytes_read, 0)
+		self.assertRaises(
+			constants.ConfigurationError, self.load, self.fifo(lines),
+			shard=(0, 2))
+
+
+if __name__ == '__main__':
+	unittest.main()
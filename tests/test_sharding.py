@@ -0,0 +1,67 @@
+import os
+import unittest
+
+import csv_harvester
+from csv_harvester import columns, constants
+from csv_harvester.utils import count_lines, parse_shard
+
+from . import HarvesterTestCase
+
+
+class ItemHarvester(csv_harvester.Harvester):
+	id = columns.IntegerField()
+	name = columns.TextField()
+
+
+class ShardingTest(HarvesterTestCase):
+	harvester = ItemHarvester
+
+	def load_shards(self, path, count, strategy=constants.SHARD_BY_BYTES,
+			**attrs):
+		ids = []
+		for index in range(count):
+			ids += self.ids(self.load(
+				path, row_offset=1, shard=(index, count),
+				shard_strategy=strategy, shard_key='name', **attrs))
+		return ids
+
+	def test_count_lines(self):
+		for newline in ('\n', '\r\n', '\r'):
+			path = self.write(['a', 'b', 'c'], newline)
+			self.assertEqual(count_lines(path, os.path.getsize(path)), 3)
+			# Blocks splitting a "\r\n" pair must not count it twice
+			self.assertEqual(
+				count_lines(path, os.path.getsize(path), block_size=2), 3)
+
+	def test_byte_shards_cover_every_row_once(self):
+		lines = ['id,name'] + ['%s,name %s' % (i, i) for i in range(100)]
+		for newline in ('\n', '\r\n', '\r'):
+			path = self.write(lines, newline)
+			for count in (1, 4, 7):
+				self.assertEqual(
+					sorted(self.load_shards(path, count)), range(100))
+
+	def test_byte_shards_reject_multiline_rows(self):
+		lines = ['id,name'] + ['%s,"line one\nline two %s"' % (i, i) for i in range(20)]
+		path = self.write(lines, '\n')
+		self.assertRaises(
+			constants.ConfigurationError, self.load_shards, path, 5)
+
+	def test_key_shards_cover_every_row_once(self):
+		lines = ['id,name'] + ['%s,name %s' % (i, i % 7) for i in range(100)]
+		path = self.write(lines, '\r')
+		self.assertEqual(sorted(self.load_shards(
+			path, 4, constants.SHARD_BY_KEY)), range(100))
+
+
+	def test_invalid_shards_rejected(self):
+		path = self.write(['id,name', '1,a'])
+		for shard in ((5, 3), (0, 0), (-1, 2), '3/3', '1', 'a/b'):
+			self.assertRaises(
+				constants.ConfigurationError, self.load, path, shard=shard)
+		self.assertEqual(parse_shard('1/3'), (1, 3))
+		self.assertEqual(parse_shard((1, 3)), (1, 3))
+
+
+if __name__ == '__main__':
+	unittest.main()
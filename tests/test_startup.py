@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import csv_harvester
+from csv_harvester import columns
+
+
+class Model(object):
+	instances = 0
+
+	def __init__(self):
+		# Attributes only set on instances, which _validate can only find by
+		# instantiating the model
+		Model.instances += 1
+		self.title = None
+		self.count = None
+
+
+class StartupTest(unittest.TestCase):
+	def test_model_instantiated_once(self):
+		for i in range(3):
+			type('Harvester%s' % i, (csv_harvester.Harvester,), {
+				'__module__': __name__,
+				'title': columns.TextField(),
+				'count': columns.IntegerField(),
+				'Meta': type('Meta', (), {'model': Model}),
+			})
+		self.assertEqual(Model.instances, 1)
+
+	def test_optional_modules_not_imported(self):
+		modules = ('decimal', 'json', 'hashlib', 'cPickle', 'zlib', 'threading', 'Queue')
+		output = subprocess.check_output([
+			sys.executable, '-c',
+			'import sys, csv_harvester; '
+			'print [m for m in %r if m in sys.modules]' % (modules,),
+		], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+		self.assertEqual(output.strip(), '[]')
+
+
+if __name__ == '__main__':
+	unittest.main()